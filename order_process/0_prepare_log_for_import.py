@@ -3,6 +3,7 @@
 
 import pandas as pd
 import time, os, csv
+from concurrent.futures import ProcessPoolExecutor
 
 #config
 
@@ -12,6 +13,14 @@ outputpath = './prepared_logs/'
 
 outputfile = 'order_process_event_table_orderhandling_prepared.csv'
 
+# multi-log mode: prepare several logs at once, each in its own worker process
+# list of (inputfile, outputfile) pairs, one per log
+option_multi_log = False
+multi_log_files = [
+    ('order_process_event_table_orderhandling.csv', 'order_process_event_table_orderhandling_prepared.csv'),
+    ('order_process_event_table_warehouse.csv', 'order_process_event_table_warehouse_prepared.csv')
+]
+
 
 def LoadLog(localFile):
     datasetList = []
@@ -30,7 +39,7 @@ def LoadLog(localFile):
     
     return headerCSV, log
 
-def PrepareOrderHandling(inputpath, outputpath, fileName):
+def PrepareLog(inputpath, outputpath, inputfile, fileName):
     csvLog = pd.read_csv(os.path.realpath(inputpath+inputfile), keep_default_na=True) #load full log from csv                  
     csvLog.drop_duplicates(keep='first', inplace=True) #remove duplicates from the dataset
     csvLog = csvLog.reset_index(drop=True) #renew the index to close gaps of removed duplicates 
@@ -40,7 +49,8 @@ def PrepareOrderHandling(inputpath, outputpath, fileName):
     # timestamp
     # Actor
     # rename columns with whitepsaces
-    csvLog = csvLog.rename(columns={'event': 'Activity','time':'timestamp','User':'Actor','Supplier Order':'SupplierOrder','Order Details':'Order_Details'})
+    # (the warehouse log names the activity and timestamp columns 'Action' and 'Time')
+    csvLog = csvLog.rename(columns={'event': 'Activity','Action': 'Activity','time':'timestamp','Time':'timestamp','User':'Actor','Supplier Order':'SupplierOrder','Order Details':'Order_Details'})
 
     # create a unique event id from the a combination of event attributes
     # this example data already has a unique event ID per event, 
@@ -67,13 +77,22 @@ def PrepareOrderHandling(inputpath, outputpath, fileName):
     logSamples.sort_values(['timestamp'], inplace=True)
 
     # and write dataframe to CSV file sorted by time
-    if not os.path.isdir(outputpath):
-        os.mkdir(outputpath)
+    os.makedirs(outputpath, exist_ok=True) # workers of the multi-log mode may create the directory concurrently
     logSamples.to_csv(outputpath+fileName, index=False)
     #logSamples.to_csv(outputpath+fileName, index=True, index_label="idx") # use this line to generate an artificial index column
 
-    
-t_start = time.time()
-PrepareOrderHandling(inputpath, outputpath, outputfile)
-t_end = time.time()
-print("Prepared data for import in: "+str((t_end - t_start))+" seconds.") 
+# run 'function(*args)' for each tuple in 'argsList' in its own worker process
+def runPerLog(function, argsList):
+    with ProcessPoolExecutor(max_workers=min(len(argsList), os.cpu_count() or 1)) as executor:
+        futures = [executor.submit(function, *args) for args in argsList]
+        for future in futures:
+            future.result() # re-raise any exception of a worker
+
+if __name__ == '__main__': # required for worker processes on platforms that spawn instead of fork
+    t_start = time.time()
+    if option_multi_log == False:
+        PrepareLog(inputpath, outputpath, inputfile, outputfile)
+    else:
+        runPerLog(PrepareLog, [(inputpath, outputpath, inp, out) for (inp, out) in multi_log_files])
+    t_end = time.time()
+    print("Prepared data for import in: "+str((t_end - t_start))+" seconds.")
@@ -23,10 +23,22 @@ inputPath = './prepared_logs/'
 inputFile = 'order_process_event_table_orderhandling_prepared.csv'
 os_inputPath = os.path.realpath(inputPath+inputFile).replace('\\','/')
 
+# multi-log mode: import several prepared logs concurrently, each in its own worker and transactions,
+# every event is tagged with the LogID of its log in property 'Log'
+# - multi_log_files: list of (inputFile, LogID) pairs, one per log, prepared with option_multi_log in 0_prepare_log_for_import.py
+# - multi_log_workers: number of concurrent workers, None for one worker per log
+option_multi_log = False
+multi_log_files = [
+    ('order_process_event_table_orderhandling_prepared.csv', 'orderhandling'),
+    ('order_process_event_table_warehouse_prepared.csv', 'warehouse')
+]
+multi_log_workers = None
+
 # Generic part for event import to Neo4j starts below
 
 import csv, time
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from neo4j import GraphDatabase
 
 # connection to Neo4J database
@@ -51,6 +63,15 @@ def getLogHeader(fileName):
         f.close()
     return logHeader
 
+# run 'function(*args)' for each tuple in 'argsList' in its own worker thread; the driver is thread-safe
+# and each worker opens its own session. The workers only wait for Neo4j, which does the actual work,
+# so their number is not bounded by the cores of this machine but set by 'multi_log_workers'.
+def runPerLog(function, argsList):
+    with ThreadPoolExecutor(max_workers=multi_log_workers or len(argsList)) as executor:
+        futures = [executor.submit(function, *args) for args in argsList]
+        for future in futures:
+            future.result() # re-raise any exception of a worker
+
 
 # Use Neo4j's bulk import from CSV to create on :event node per record in CSV file
 # - 'fileName' is the system file path to the CSV file from which Neo4j will load
@@ -103,11 +124,24 @@ runQuery(driver, qCleanDatabase_allNodes)     # delete all nodes, comment out if
 
 #### Step 1.b) ... and re-import all events from scratch
 print('\nImport events from CSV')
-# load log header for import and post-processing
-logHeader = getLogHeader(os_inputPath)
-# create import query to convert each record in the input file into an event node (with all record attributes as event node properties)
-qCreateEvents = CreateEventQuery(os_inputPath, logHeader, 'order_process')
-runQuery(driver, qCreateEvents) # create event nodes, comment out if the DB already contains event nodes and you don't want to new ones/duplicates
+if option_multi_log == False:
+    # load log header for import and post-processing
+    logHeader = getLogHeader(os_inputPath)
+    # create import query to convert each record in the input file into an event node (with all record attributes as event node properties)
+    qCreateEvents = CreateEventQuery(os_inputPath, logHeader, 'order_process')
+    runQuery(driver, qCreateEvents) # create event nodes, comment out if the DB already contains event nodes and you don't want to new ones/duplicates
+else:
+    # index on the LogID so that the per-log queries (here and in 2_build_event_knowledge_graph.py) only touch the events of their own log
+    runQuery(driver, 'CREATE INDEX Event_Log IF NOT EXISTS FOR (e:Event) ON (e.Log)')
+
+    # import one log in its own session, CreateEventQuery commits in its own batched transactions
+    def importLog(fileName, LogID):
+        os_logPath = os.path.realpath(inputPath+fileName).replace('\\','/')
+        qCreateLogEvents = CreateEventQuery(os_logPath, getLogHeader(os_logPath), LogID)
+        runQuery(driver, qCreateLogEvents)
+
+    # each worker only creates the event nodes of its own log
+    runPerLog(importLog, multi_log_files)
 
 #### Step 1.c) example of querying for the number of event nodes in the DB
 q_countImportedEvents = "MATCH (e:Event) RETURN count(e)"
@@ -135,10 +169,12 @@ def qGetAllEventProperties(tx):
     return allProperties
 
 # for any :Event node where property 'prop' has a comma-separate string as value, replace the string by the list of values
-def qSplitPropertyStringsToList(tx, allProperties):
+# - an optional `LogID` to only split the values of the events of this log
+def qSplitPropertyStringsToList(tx, allProperties, LogID = ""):
+    WHERE_log = f'e.Log = "{LogID}" AND ' if LogID != "" else ''
     for prop in allProperties:
         q_splitValue = f'''
-            MATCH (e:Event) WHERE e.{prop} <> "null" AND e.{prop} CONTAINS ',' WITH e,split(e.{prop}, ',') AS vals
+            MATCH (e:Event) WHERE {WHERE_log}e.{prop} <> "null" AND e.{prop} CONTAINS ',' WITH e,split(e.{prop}, ',') AS vals
             SET e.{prop}=vals'''
         print(q_splitValue)
         tx.run(q_splitValue)
@@ -148,4 +184,15 @@ def qSplitPropertyStringsToList(tx, allProperties):
 with driver.session() as session:
     allProperties = session.execute_read(qGetAllEventProperties)
     allProperties.remove("timestamp") # do not process the timestamp attribute
-    session.execute_write(qSplitPropertyStringsToList, allProperties)
\ No newline at end of file
+    if option_multi_log == False:
+        session.execute_write(qSplitPropertyStringsToList, allProperties)
+
+# in multi-log mode, split the values of each log in its own worker and transaction
+if option_multi_log == True:
+    allProperties.remove("Log") # do not process the log identifier
+
+    def splitLogProperties(LogID):
+        with driver.session() as session:
+            session.execute_write(qSplitPropertyStringsToList, allProperties, LogID)
+
+    runPerLog(splitLogProperties, [(LogID,) for (_, LogID) in multi_log_files])
@@ -1,7 +1,24 @@
 # Build event knowledge graph for Order Process example
 
+from concurrent.futures import ThreadPoolExecutor
 from neo4j import GraphDatabase
 
+# multi-log mode: build the graph over all logs imported with option_multi_log in 1_import_events.py,
+# entities shared by the logs (e.g., Item, Tray) are created once and correlated to the events of all logs;
+# the logs are read from property 'Log' of the events, each log is processed in its own worker and transactions
+# - option_df_per_log: True to build DF only between events of the same log, False to build DF across logs
+# - multi_log_workers: number of concurrent workers, None for one worker per log
+option_multi_log = False
+option_df_per_log = True
+multi_log_workers = None
+
+# run 'function(*args)' for each tuple in 'argsList' in its own worker thread, as in 1_import_events.py
+def runPerLog(function, argsList):
+    with ThreadPoolExecutor(max_workers=multi_log_workers or len(argsList)) as executor:
+        futures = [executor.submit(function, *args) for args in argsList]
+        for future in futures:
+            future.result() # re-raise any exception of a worker
+
 # connection to Neo4J database
 # the queries in this file make use of the APOC library, make sure to have the APOC plugin installed for this DB instance
 driver = GraphDatabase.driver("bolt://localhost:7687", auth=("neo4j", "12341234"))
@@ -46,6 +63,10 @@ model_entities_from_attributes = [
             ["Payment", "Payment", ""]
         ]  
 
+# the warehouse log additionally records the trays in which items are stored
+if option_multi_log == True:
+    model_entities_from_attributes.append(["Tray", "Tray", ""])
+
 def q_create_entity(tx, entity_type, attribute_holding_id, WHERE_event_property):
     qCreateEntity = f'''
             MATCH (e:Event) {WHERE_event_property}
@@ -63,55 +84,134 @@ def q_correlate_events_to_entity(tx, entity_type, attribute_holding_id, WHERE_ev
     print(qCorrelate)
     tx.run(qCorrelate)
 
+# return the LogIDs of all imported logs
+def q_get_log_ids(tx):
+    qGetLogIDs = '''
+            MATCH (e:Event) WHERE e.Log IS NOT NULL
+            RETURN DISTINCT e.Log AS log'''
+    print(qGetLogIDs)
+    return [record['log'] for record in tx.run(qGetLogIDs)]
+
+# create the entities of one entity type in one pass over the events of all logs,
+# each identifier is deduplicated before it is merged so that shared entities are created exactly once
+def q_create_entity_deduplicated(tx, entity_type, attribute_holding_id, WHERE_event_property):
+    qCreateEntity = f'''
+            MATCH (e:Event) {WHERE_event_property}
+            UNWIND e.{attribute_holding_id} AS id
+            WITH DISTINCT id
+            MERGE (en:Entity {{ID:id, uID:("{entity_type}"+toString(id)), EntityType:"{entity_type}" }})'''
+    print(qCreateEntity)
+    tx.run(qCreateEntity)
 
-with driver.session() as session:
-    for ent in model_entities_from_attributes:
-        session.execute_write(q_create_entity,ent[0],ent[1],ent[2])
-        session.execute_write(q_correlate_events_to_entity,ent[0],ent[1],ent[2])
+# query to correlate the events of log 'LogID' to the (already created) entities of one entity type,
+# the :CORR relations are created in batches of 'batch_size' rows, each batch in its own transaction;
+# creating a relation locks the event and the entity node: the events of different logs are disjoint,
+# and ordering the rows by entity makes all workers lock shared entities in the same order, so workers
+# of different logs may wait for each other on a shared entity, but do not deadlock each other
+def q_correlate_log_events_to_entity(entity_type, attribute_holding_id, WHERE_event_property, LogID, batch_size = 10000):
+    WHERE_log = f'WHERE e.Log = "{LogID}"' if WHERE_event_property == "" else f'AND e.Log = "{LogID}"'
+    qCorrelate = f'''
+            MATCH (e:Event) {WHERE_event_property} {WHERE_log}
+            UNWIND e.{attribute_holding_id} AS id
+            MATCH (n:Entity {{EntityType: "{entity_type}" }}) WHERE n.ID = id
+            WITH e, n ORDER BY n.uID
+            CALL {{ WITH e, n
+                CREATE (e)-[:CORR]->(n) }} IN TRANSACTIONS OF {batch_size} ROWS'''
+    return qCorrelate
+
+
+if option_multi_log == False:
+    with driver.session() as session:
+        for ent in model_entities_from_attributes:
+            session.execute_write(q_create_entity,ent[0],ent[1],ent[2])
+            session.execute_write(q_correlate_events_to_entity,ent[0],ent[1],ent[2])
+else:
+    # index to look up entities when correlating the events of each log
+    runQuery(driver, 'CREATE INDEX Entity_EntityType_ID IF NOT EXISTS FOR (n:Entity) ON (n.EntityType, n.ID)')
+
+    with driver.session() as session:
+        multi_log_ids = session.execute_read(q_get_log_ids)
+        # pre-create all entities before the workers start, so the workers never MERGE the same entity
+        for ent in model_entities_from_attributes:
+            session.execute_write(q_create_entity_deduplicated,ent[0],ent[1],ent[2])
+
+    # correlate the events of each log in its own worker,
+    # CALL {...} IN TRANSACTIONS has to run in an auto-commit transaction, i.e., via runQuery
+    def correlate_log(LogID):
+        for ent in model_entities_from_attributes:
+            runQuery(driver, q_correlate_log_events_to_entity(ent[0],ent[1],ent[2],LogID))
+
+    runPerLog(correlate_log, [(LogID,) for LogID in multi_log_ids])
 
 ### Build Event Knowledge Graph:
 ### Step 2) Infer Directly-Follows Relation between correlated evente
 
-def q_create_directly_follows(tx):
+# - an optional `LogID` to only order the events of this log, the DF relations then get property 'Log'
+def q_create_directly_follows(tx, LogID = ""):
+    if LogID == "":
+        qMatch = '''MATCH (n:Entity)
+        MATCH (n)<-[:CORR]-(e)'''
+        df_log = ''
+    else:
+        # start from the events of the log (using the index on Event.Log) instead of from all entities
+        qMatch = f'''MATCH (e:Event) WHERE e.Log = "{LogID}"
+        MATCH (e)-[:CORR]->(n:Entity)'''
+        df_log = f', Log:"{LogID}"'
     qCreateDF = f'''
-        MATCH (n:Entity)
-        MATCH (n)<-[:CORR]-(e)
+        {qMatch}
         WITH n, e AS nodes ORDER BY e.timestamp, ID(e)
         WITH n, collect(nodes) AS event_node_list
         UNWIND range(0, size(event_node_list)-2) AS i
         WITH n, event_node_list[i] AS e1, event_node_list[i+1] AS e2
         
-        MERGE (e1)-[df:DF {{EntityType:n.EntityType, ID:n.ID}}]->(e2)'''
+        MERGE (e1)-[df:DF {{EntityType:n.EntityType, ID:n.ID{df_log}}}]->(e2)'''
     
     print(qCreateDF)
     tx.run(qCreateDF)
 
 
-def q_create_directly_follows_typed(tx, entity_type):
+# - an optional `LogID` to only order the events of this log, the DF relations then get property 'Log'
+def q_create_directly_follows_typed(tx, entity_type, LogID = ""):
 
     entity_type_safe_str = entity_type.replace(' ','_')
+    if LogID == "":
+        qMatch = f'''MATCH ( n : Entity ) WHERE n.EntityType="{entity_type}"
+        MATCH ( n ) <-[:CORR]- ( e )'''
+        df_log = ''
+    else:
+        # start from the events of the log (using the index on Event.Log) instead of from all entities
+        qMatch = f'''MATCH ( e : Event ) WHERE e.Log = "{LogID}"
+        MATCH ( e ) -[:CORR]-> ( n : Entity ) WHERE n.EntityType="{entity_type}"'''
+        df_log = f', Log:"{LogID}"'
 
     qCreateDF = f'''
-        MATCH ( n : Entity ) WHERE n.EntityType="{entity_type}"
-        MATCH ( n ) <-[:CORR]- ( e )
+        {qMatch}
         
         WITH n , e as nodes ORDER BY e.timestamp,ID(e)
         WITH n , collect ( nodes ) as nodeList
         UNWIND range(0,size(nodeList)-2) AS i
         WITH n , nodeList[i] as first, nodeList[i+1] as second
 
-        MERGE ( first ) -[df:DF_{entity_type_safe_str} {{ ID:n.ID }}]->( second )'''
+        MERGE ( first ) -[df:DF_{entity_type_safe_str} {{ ID:n.ID{df_log} }}]->( second )'''
 
     print(qCreateDF)
     tx.run(qCreateDF)
 
 option_df_typed = False
 
-with driver.session() as session:
-    
-    if option_df_typed == False: # for generic DF relations
-        session.execute_write(q_create_directly_follows)
-    else:
-        for ent in model_entities_from_attributes:
-            session.execute_write(q_create_directly_follows_typed,ent[0])
+# build the DF relations (of one log if a LogID is given)
+def build_directly_follows(LogID = ""):
+    with driver.session() as session:
+
+        if option_df_typed == False: # for generic DF relations
+            session.execute_write(q_create_directly_follows, LogID)
+        else:
+            for ent in model_entities_from_attributes:
+                session.execute_write(q_create_directly_follows_typed,ent[0],LogID)
+
+if option_multi_log == True and option_df_per_log == True:
+    # each worker only creates DF relations between the events of its own log
+    runPerLog(build_directly_follows, [(LogID,) for LogID in multi_log_ids])
+else:
+    build_directly_follows()
 